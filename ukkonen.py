@@ -1,6 +1,35 @@
-import json
 import unittest
 
+try:
+    import ukkonen_numba
+except ImportError:
+    ukkonen_numba = None
+
+
+# The string currently indexed by the node classes, held as UTF-8 bytes so
+# that indexing yields small ints (the letter codes) directly. Nodes store
+# only integer offsets into this buffer instead of carrying a reference each;
+# the root owns the encoded buffer and rebinds it on entry points, so several
+# trees can coexist as long as they are not traversed concurrently. The
+# memoryview alongside lets searches compare blocks without copying them out.
+_string = b''
+_buffer = memoryview(b'')
+
+# Results of root-rooted traces, keyed by (start, end). Suffix-link chains
+# keep re-tracing the same slices from the root; the cache short-circuits
+# them. Splitting an edge can invalidate any traced point, so the cache is
+# emptied on every split (and whenever the buffer is rebound).
+_trace_cache = {}
+
+
+def _set_string(string):
+    global _string, _buffer
+    if isinstance(string, str):
+        string = string.encode('utf-8')
+    _string = string
+    _buffer = memoryview(string)
+    _trace_cache.clear()
+
 
 class BaseNode(object):
 
@@ -8,6 +37,8 @@ class BaseNode(object):
     Interface class for implicit and excplicit nodes.
     """
 
+    __slots__ = ()
+
     def add_edge(self, position):
         """
         Performs adding a new edge for letter at position `position` in the original string to the node.
@@ -31,23 +62,90 @@ class Node(BaseNode):
     Excplicit node (one that either has several children or is a leaf node).
     """
 
-    def __init__(self, string, parent_node, edge_start, edge_end=None):
-        self.string = string
+    __slots__ = ('parent_node', 'edge_start', 'edge_end', 'alphabet_base',
+                 'alphabet_size', 'edges', 'edge_count', '_suffix_link', 'is_root')
+
+    # Blank instances created ahead of time: construction allocates nodes in
+    # bursts of _ARENA_BATCH, which groups them on the heap (better locality
+    # for traversals) and takes the allocator out of the per-node hot path.
+    _ARENA_BATCH = 1024
+    _arena = []
+
+    def __new__(cls, *args):
+        if cls is Node:
+            arena = cls._arena
+            if not arena:
+                arena.extend(object.__new__(cls) for _ in range(cls._ARENA_BATCH))
+            return arena.pop()
+        return object.__new__(cls)
+
+    def __init__(self, parent_node, edge_start, edge_end=None):
         self.parent_node = parent_node
         self.edge_start = edge_start
-        self.edge_end = edge_end or len(string)
-        self.edges = {}
+        self.edge_end = len(_string) if edge_end is None else edge_end
+        if parent_node is None:
+            # Only the root computes the alphabet bounds; every other node
+            # inherits them, so the computation happens once per tree. Edge
+            # lists are sized to the span of codes actually present and
+            # indexed relative to the smallest one.
+            if _string:
+                self.alphabet_base = min(_string)
+                self.alphabet_size = max(_string) - self.alphabet_base + 1
+            else:
+                self.alphabet_base = 0
+                self.alphabet_size = 0
+        else:
+            self.alphabet_base = parent_node.alphabet_base
+            self.alphabet_size = parent_node.alphabet_size
+        # Edge storage is allocated on the first insertion: most nodes are
+        # leaves and never hold a single edge, so they all share the None
+        # sentinel instead of one container each.
+        self.edges = None
+        self.edge_count = 0
         self._suffix_link = None
         self.is_root = False
 
+    def get_edge(self, letter):
+        """
+        Returns the child node for the letter code `letter` or None if there
+        is no such edge.
+        """
+        edges = self.edges
+        if edges is None:
+            return None
+        code = letter - self.alphabet_base
+        if 0 <= code < self.alphabet_size:
+            return edges[code]
+        return None
+
+    def set_edge(self, letter, node):
+        edges = self.edges
+        if edges is None:
+            edges = self.edges = [None] * self.alphabet_size
+        code = letter - self.alphabet_base
+        if edges[code] is None:
+            self.edge_count += 1
+        edges[code] = node
+
+    def iter_edges(self):
+        if self.edges is None:
+            return iter(())
+        return (edge for edge in self.edges if edge is not None)
+
+    def edge_letters(self):
+        if self.edges is None:
+            return []
+        base = self.alphabet_base
+        return [chr(code + base) for code, edge in enumerate(self.edges) if edge is not None]
+
     def add_edge(self, position):
-        letter = self.string[position]
-        if letter in self.edges:
+        letter = _string[position]
+        if self.get_edge(letter) is not None:
             # Type 3: nothing to do
             operation_type = 3
-        elif self.edges or self.is_root:
+        elif self.edge_count or self.is_root:
             # Type 2: added a new edge
-            self.edges[letter] = Node(self.string, self, position)
+            self.set_edge(letter, Node(self, position))
             operation_type = 2
         else:
             # Type 1: leaf node, extended automatically
@@ -56,8 +154,20 @@ class Node(BaseNode):
         return operation_type, self.trace_string(position)
 
     def _get_suffix_link(self):
-        if not self._suffix_link:
-            self._suffix_link = self._calculate_suffix_link()
+        # The root has no suffix link; checking the flag here spares RootNode
+        # a property override (and its descriptor dispatch on every access).
+        if self.is_root:
+            return None
+
+        # `is None` rather than truthiness: a falsy node must not retrigger
+        # the computation.
+        if self._suffix_link is None:
+            suffix_link = self._calculate_suffix_link()
+            if isinstance(suffix_link, ImplicitNode):
+                # An implicit link goes stale as soon as its edge is split,
+                # so it must not be cached.
+                return suffix_link
+            self._suffix_link = suffix_link
 
         return self._suffix_link
 
@@ -78,39 +188,52 @@ class Node(BaseNode):
         return suffix_link
 
     def trace_string(self, start, end=None):
-        end = end or start + 1
-        if start == end:
-            return self
-
-        letter = self.string[start]
-        edge = self.edges[letter]
-        if end - start >= edge.length:
-            return edge.trace_string(start + edge.length, end)
-        else:
-            return ImplicitNode(edge, edge.edge_start + end - start)
+        # An explicit None check: `end or ...` would misread a legitimate
+        # end of 0 and costs a truthiness call per trace.
+        if end is None:
+            end = start + 1
+
+        node = self
+        while start < end:
+            edge = node.get_edge(_string[start])
+            length = edge.edge_end - edge.edge_start
+            if end - start < length:
+                return ImplicitNode(edge, edge.edge_start + end - start)
+            start += length
+            node = edge
+
+        return node
 
     def search_string(self, pattern):
         """
         This method in contrast to `trace_string` performs search of a pattern and doesn't rely on the fact that pattern
         exists in the tree (it may not exist as well).
         """
-        if not pattern:
-            return True
+        if isinstance(pattern, str):
+            pattern = pattern.encode('utf-8')
 
-        letter = pattern[0]
-        if letter not in self.edges:
-            return False
+        node = self
+        position = 0
+        pattern_length = len(pattern)
+        buffer = _buffer
+        pattern_buffer = memoryview(pattern)
 
-        edge = self.edges[letter]
+        while position < pattern_length:
+            edge = node.get_edge(pattern[position])
+            if edge is None:
+                return False
 
-        pattern_chunk = pattern[:edge.length]
-        edge_chunk = self.string[edge.edge_start:edge.edge_end][:len(pattern)]
+            edge_position = edge.edge_start
+            chunk = min(edge.edge_end - edge_position, pattern_length - position)
+            # One copy-free C-level block comparison instead of a
+            # Python-level loop over single characters.
+            if buffer[edge_position:edge_position + chunk] != pattern_buffer[position:position + chunk]:
+                return False
+            position += chunk
 
-        if pattern_chunk == edge_chunk:
-            if len(pattern) >= edge.length:
-                return edge.search_string(pattern[edge.length:])
-            return True
-        return False
+            node = edge
+
+        return True
 
     @property
     def length(self):
@@ -118,19 +241,25 @@ class Node(BaseNode):
 
     def serialize(self):
         children = {}
-        for child in self.edges.itervalues():
-            children.update(child.serialize())
+        stack = [(self, children)]
+        while stack:
+            node, container = stack.pop()
+            for child in node.iter_edges():
+                child_container = {}
+                label = _string[child.edge_start:child.edge_end].decode('utf-8', 'replace')
+                container[label] = child_container
+                stack.append((child, child_container))
 
         serialized = {
-            self.string[self.edge_start:self.edge_end]: children,
+            _string[self.edge_start:self.edge_end].decode('utf-8', 'replace'): children,
         }
 
         return serialized
 
     def __str__(self):
         return '%s (%s) --> %s' % (str(self.parent_node),
-                                   ', '.join(self.parent_node.edges.keys()),
-                                   self.string[self.edge_start:self.edge_end])
+                                   ', '.join(self.parent_node.edge_letters()),
+                                   _string[self.edge_start:self.edge_end].decode('utf-8', 'replace'))
 
     def __repr__(self):
         return self.__str__()
@@ -142,16 +271,40 @@ class RootNode(Node):
     Special root node.
     """
 
+    __slots__ = ('string',)
+
     def __init__(self, string):
-        super(RootNode, self).__init__(string, None, 0, 0)
-        self.edge_end = 0
+        _set_string(string)
+        super(RootNode, self).__init__(None, 0, 0)
+        # The root keeps the encoded buffer so entry points can rebind the
+        # module-level buffer without re-encoding.
+        self.string = _string
         self.is_root = True
 
-    @property
-    def suffix_link(self):
-        return None
+    def rebind(self):
+        """
+        Points the module-level buffer at this tree's encoded string.
+        """
+        _set_string(self.string)
+
+    def trace_string(self, start, end=None):
+        # functools.lru_cache does not fit here: entries must be dropped
+        # whenever a split mutates the tree, so a plain dict is used and
+        # cleared explicitly.
+        if end is None:
+            end = start + 1
+        key = (start, end)
+        traced = _trace_cache.get(key)
+        if traced is None:
+            traced = _trace_cache[key] = super(RootNode, self).trace_string(start, end)
+        return traced
+
+    def search_string(self, pattern):
+        self.rebind()
+        return super(RootNode, self).search_string(pattern)
 
     def serialize(self):
+        self.rebind()
         serialized = super(RootNode, self).serialize()
         serialized = serialized['']
         return serialized
@@ -170,17 +323,20 @@ class ImplicitNode(BaseNode):
     be between `self.node.edge_start` and `self.node.edge_end` (not inclusively).
     """
 
+    __slots__ = ('node', 'position', 'is_root', '_suffix_link')
+
     def __init__(self, node, position):
         self.node = node
         self.position = position
         self.is_root = False
+        self._suffix_link = None
 
     def add_edge(self, position):
-        letter = self.node.string[position]
-        next_letter = self.node.string[self.position]
+        letter = _string[position]
+        next_letter = _string[self.position]
 
         if letter == next_letter:
-            if self.node.edges or self.position < position:  # Internal node
+            if self.node.edge_count or self.position < position:  # Internal node
                 # Type 3: nothing to do
                 operation_type = 3
             else:
@@ -191,69 +347,124 @@ class ImplicitNode(BaseNode):
                 return operation_type, self.node
             return operation_type, ImplicitNode(self.node, self.position + 1)
         else:
-            # Split the edge
-            predecessor = self.node.parent_node
+            # Split the edge; traced points may now lie on the two halves,
+            # so the root's trace cache is stale.
+            _trace_cache.clear()
             ancestor = self.node
+            split_position = self.position
+            predecessor = ancestor.parent_node
 
-            middle_node = Node(self.node.string, predecessor, ancestor.edge_start, self.position)
-            predecessor.edges[self.node.string[middle_node.edge_start]] = middle_node
+            middle_node = Node(predecessor, ancestor.edge_start, split_position)
+            predecessor.set_edge(_string[ancestor.edge_start], middle_node)
 
-            ancestor.edge_start = self.position
+            ancestor.edge_start = split_position
             ancestor.parent_node = middle_node
-            middle_node.edges[next_letter] = self.node
+            middle_node.set_edge(next_letter, ancestor)
 
             # Add new edge
-            new_node = Node(self.node.string, middle_node, position)
-            middle_node.edges[letter] = new_node
+            new_node = Node(middle_node, position)
+            middle_node.set_edge(letter, new_node)
 
-            return 2, middle_node.trace_string(position)  # Type 2: added a new edge
+            # The traced result is known to lie on the freshly added edge, so
+            # it is built directly instead of going through trace_string.
+            if new_node.edge_end - position == 1:
+                return 2, new_node  # Type 2: added a new edge
+            return 2, ImplicitNode(new_node, position + 1)
 
     @property
     def suffix_link(self):
+        if self._suffix_link is not None:
+            return self._suffix_link
+
         parent_suffix_link = self.node.parent_node.suffix_link
 
         if parent_suffix_link is None:
-            assert isinstance(self.node.parent_node, RootNode)
+            assert self.node.parent_node.is_root
             suffix_link = self.node.parent_node.trace_string(self.node.edge_start + 1, self.position)
 
         else:
             suffix_link = parent_suffix_link.trace_string(self.node.edge_start, self.position)
 
+        self._suffix_link = suffix_link
         return suffix_link
 
     def trace_string(self, start, end=None):
-        end = end or start + 1
-        if start - end < self.node.edge_end - self.position:
+        if end is None:
+            end = start + 1
+        remaining = self.node.edge_end - self.position
+        if end - start < remaining:
             return ImplicitNode(self.node, self.position + end - start)
-        else:
-            return self.node.trace_string(start + self.node.edge_end - self.position, end)
+        if end - start == remaining:
+            # The traced point sits exactly at the end of the edge: that is
+            # the explicit node itself, no implicit node is needed.
+            return self.node
+        return self.node.trace_string(start + remaining, end)
 
 
 class Ukkonen(object):
     def __init__(self, string):
-        root_node = RootNode(string)
+        self.string = string
+
+        if ukkonen_numba is not None and ukkonen_numba.supports(string):
+            arrays = ukkonen_numba.build_arrays(string)
+            self._tree = ukkonen_numba.Tree(string, arrays).root
+        else:
+            self._tree = self._build()
+
+    def _build(self):
+        root_node = RootNode(self.string)
 
         current_node = root_node
-        for i in xrange(len(string)):
+        # The internal node created by the most recent split whose suffix
+        # link is still unresolved.
+        pending_node = None
+        for i in range(len(_string)):
             while True:
                 operation_type, new_node = current_node.add_edge(i)
 
+                if operation_type == 2 and isinstance(current_node, ImplicitNode):
+                    # The split reparented the edge under a new middle node.
+                    middle_node = current_node.node.parent_node
+                else:
+                    middle_node = None
+
+                if pending_node is not None:
+                    # Ukkonen's rule: the node split off in the previous
+                    # extension links to the explicit node this extension
+                    # lands on (or creates). Extensions ending inside an
+                    # edge keep the lazy computation as a fallback.
+                    if middle_node is not None:
+                        target = middle_node
+                    elif isinstance(current_node, Node):
+                        target = current_node
+                    else:
+                        target = None
+                    if target is not None and target is not pending_node:
+                        pending_node.suffix_link = target
+                        pending_node = None
+
+                if middle_node is not None:
+                    pending_node = middle_node
+
                 if operation_type == 3 or current_node.is_root:
                     current_node = new_node
                     break
 
                 current_node = current_node.suffix_link
 
-        self.tree = root_node
+        return root_node
+
+    @property
+    def tree(self):
+        return self._tree
 
     def search(self, pattern):
-        return self.tree.search_string(pattern)
+        return self._tree.search_string(pattern)
 
 
 class TestUkkonen(unittest.TestCase):
     def setUp(self):
         self.ukkonen = Ukkonen('mississippi')
-        print json.dumps(self.ukkonen.tree.serialize(), indent=4)
 
     def test(self):
         self.assertTrue(self.ukkonen.search('issi'))
@@ -265,6 +476,42 @@ class TestUkkonen(unittest.TestCase):
         self.assertFalse(self.ukkonen.search('issisi'))
         self.assertFalse(self.ukkonen.search('mississippis'))
 
+    def test_serialize(self):
+        self.assertEqual(self.ukkonen.tree.serialize(), {
+            'mississippi': {},
+            'i': {'ppi': {}, 'ssi': {'ppi': {}, 'ssippi': {}}},
+            'p': {'i': {}, 'pi': {}},
+            's': {'i': {'ppi': {}, 'ssippi': {}}, 'si': {'ppi': {}, 'ssippi': {}}},
+        })
+
+
+class TestUkkonenPurePython(TestUkkonen):
+
+    """
+    Runs the same assertions against the pure-Python builder even when the
+    jitted one is importable, and cross-checks the two builders.
+    """
+
+    @staticmethod
+    def _build_pure(string):
+        global ukkonen_numba
+        jitted, ukkonen_numba = ukkonen_numba, None
+        try:
+            return Ukkonen(string)
+        finally:
+            ukkonen_numba = jitted
+
+    def setUp(self):
+        self.ukkonen = self._build_pure('mississippi')
+
+    def test_matches_jitted_builder(self):
+        if ukkonen_numba is None:
+            self.skipTest('the jitted builder is not available')
+        for string in ('mississippi', 'aaabaac', 'ccabcbccacabbcaa', 'banana'):
+            arrays = ukkonen_numba.build_arrays(string)
+            jitted = ukkonen_numba.Tree(string, arrays).root
+            self.assertEqual(self._build_pure(string).tree.serialize(), jitted.serialize())
+
 
 if __name__ == '__main__':
     unittest.main()
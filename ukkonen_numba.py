@@ -0,0 +1,413 @@
+"""
+Optional Numba-accelerated builder for the Ukkonen suffix tree.
+
+The `ukkonen` module imports this one lazily; when numba/numpy are not
+installed the pure-Python builder is used instead. The construction here
+operates on flat parallel arrays ("structure of arrays") with integer
+node ids, so the whole O(n) build runs inside jitted code without any
+Python-level attribute access or method dispatch. Children of a node
+form a singly linked sibling list (`first_child`/`next_sibling`); an
+implicit point on an edge is represented as a `(node, position)` pair
+where `position == NO_NODE` means the point is the explicit node itself.
+"""
+
+import numpy as np
+from numba import njit
+
+ROOT = 0
+NO_NODE = -1
+
+
+class Tree(object):
+
+    """
+    Owns the parallel node arrays produced by `build_arrays` and walks
+    them directly, so search and serialization never materialise
+    per-node objects.
+    """
+
+    def __init__(self, string, arrays):
+        self.string = string
+        (self.edge_start, self.edge_end, self.parent, self.suffix_link,
+         self.first_child, self.next_sibling) = arrays
+
+    @property
+    def root(self):
+        return NodeView(self, ROOT)
+
+    def find_edge(self, node_id, letter):
+        """
+        Returns the id of the child of `node_id` whose edge starts with
+        `letter`, or NO_NODE.
+        """
+        child = int(self.first_child[node_id])
+        while child != NO_NODE:
+            if self.string[int(self.edge_start[child])] == letter:
+                return child
+            child = int(self.next_sibling[child])
+        return NO_NODE
+
+    def search_string(self, node_id, pattern):
+        if isinstance(pattern, bytes):
+            # The pure-Python builder accepts bytes patterns; keep the two
+            # backends in agreement. Jitted trees are ASCII-only, so a
+            # pattern that does not decode cannot be contained either.
+            try:
+                pattern = pattern.decode('ascii')
+            except UnicodeDecodeError:
+                return False
+
+        string = self.string
+        position = 0
+        while position < len(pattern):
+            child = self.find_edge(node_id, pattern[position])
+            if child == NO_NODE:
+                return False
+
+            start = int(self.edge_start[child])
+            end = int(self.edge_end[child])
+            chunk = min(end - start, len(pattern) - position)
+            if pattern[position:position + chunk] != string[start:start + chunk]:
+                return False
+
+            position += chunk
+            node_id = child
+        return True
+
+    def serialize_children(self, node_id):
+        """
+        Returns the nested-dict serialization of the subtree below
+        `node_id`, one dict per node, without recursion.
+        """
+        string = self.string
+        result = {}
+        containers = {node_id: result}
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            container = containers[current]
+            child = int(self.first_child[current])
+            while child != NO_NODE:
+                label = string[int(self.edge_start[child]):int(self.edge_end[child])]
+                container[label] = containers[child] = {}
+                stack.append(child)
+                child = int(self.next_sibling[child])
+        return result
+
+
+class NodeView(object):
+
+    """
+    Lightweight explicit-node view over a `Tree`: stores only the tree
+    reference and an integer node id and forwards everything else to the
+    arrays. Mirrors the parts of the `Node` interface used after
+    construction.
+    """
+
+    __slots__ = ('tree', 'node_id')
+
+    def __init__(self, tree, node_id):
+        self.tree = tree
+        self.node_id = node_id
+
+    @property
+    def edge_start(self):
+        return int(self.tree.edge_start[self.node_id])
+
+    @property
+    def edge_end(self):
+        return int(self.tree.edge_end[self.node_id])
+
+    @property
+    def length(self):
+        return self.edge_end - self.edge_start
+
+    @property
+    def is_root(self):
+        return self.node_id == ROOT
+
+    @property
+    def parent_node(self):
+        parent_id = int(self.tree.parent[self.node_id])
+        if parent_id == NO_NODE:
+            return None
+        return NodeView(self.tree, parent_id)
+
+    @property
+    def suffix_link(self):
+        link_id = int(self.tree.suffix_link[self.node_id])
+        if link_id == NO_NODE:
+            return None
+        return NodeView(self.tree, link_id)
+
+    def get_edge(self, letter):
+        child_id = self.tree.find_edge(self.node_id, letter)
+        if child_id == NO_NODE:
+            return None
+        return NodeView(self.tree, child_id)
+
+    def iter_edges(self):
+        child_id = int(self.tree.first_child[self.node_id])
+        while child_id != NO_NODE:
+            yield NodeView(self.tree, child_id)
+            child_id = int(self.tree.next_sibling[child_id])
+
+    def search_string(self, pattern):
+        return self.tree.search_string(self.node_id, pattern)
+
+    def serialize(self):
+        children = self.tree.serialize_children(self.node_id)
+        if self.node_id == ROOT:
+            return children
+        return {self.tree.string[self.edge_start:self.edge_end]: children}
+
+
+def supports(string):
+    """
+    Returns True if `string` can be handled by the jitted builder
+    (positions in the byte encoding must match positions in the string).
+    """
+    try:
+        encoded = string.encode('ascii')
+    except (AttributeError, UnicodeDecodeError, UnicodeEncodeError):
+        # Bytes input is handled by the pure-Python builder.
+        return False
+    return len(encoded) == len(string)
+
+
+def build_arrays(string):
+    """
+    Builds the suffix tree of `string` and returns the parallel node
+    arrays (edge_start, edge_end, parent, suffix_link, first_child,
+    next_sibling) truncated to the number of allocated nodes. Node 0 is
+    the root; leaves have edge_end == len(string).
+    """
+    codes = np.frombuffer(string.encode('ascii'), dtype=np.uint8)
+    n = len(codes)
+    # One root, at most n leaves and n - 1 internal nodes.
+    capacity = 2 * n + 2
+    edge_start = np.zeros(capacity, dtype=np.int32)
+    edge_end = np.zeros(capacity, dtype=np.int32)
+    parent = np.full(capacity, NO_NODE, dtype=np.int32)
+    suffix_link = np.full(capacity, NO_NODE, dtype=np.int32)
+    first_child = np.full(capacity, NO_NODE, dtype=np.int32)
+    next_sibling = np.full(capacity, NO_NODE, dtype=np.int32)
+    edge_letter = np.zeros(capacity, dtype=np.uint8)
+
+    node_count = build(codes, edge_start, edge_end, parent, suffix_link,
+                       first_child, next_sibling, edge_letter)
+
+    return (edge_start[:node_count], edge_end[:node_count],
+            parent[:node_count], suffix_link[:node_count],
+            first_child[:node_count], next_sibling[:node_count])
+
+
+@njit(cache=True)
+def _find_child(first_child, next_sibling, edge_letter, node, code):
+    child = first_child[node]
+    while child != NO_NODE:
+        if edge_letter[child] == code:
+            return child
+        child = next_sibling[child]
+    return NO_NODE
+
+
+@njit(cache=True)
+def _trace(codes, edge_start, edge_end, first_child, next_sibling,
+           edge_letter, node, position, start, end):
+    """
+    Traces `codes[start:end]` downwards from the point `(node, position)`
+    assuming the traced string exists in the tree. Returns the resulting
+    point.
+    """
+    if position != NO_NODE:
+        remaining = edge_end[node] - position
+        if end - start < remaining:
+            return node, position + (end - start)
+        start += remaining
+    while start < end:
+        child = _find_child(first_child, next_sibling, edge_letter,
+                            node, codes[start])
+        if child == NO_NODE:
+            # Unreachable for well-formed input; bail out instead of
+            # reading garbage.
+            return node, NO_NODE
+        length = edge_end[child] - edge_start[child]
+        if end - start >= length:
+            start += length
+            node = child
+        else:
+            return child, edge_start[child] + (end - start)
+    return node, NO_NODE
+
+
+@njit(cache=True)
+def _suffix_explicit(codes, edge_start, edge_end, parent, suffix_link,
+                     first_child, next_sibling, edge_letter, stack, node):
+    """
+    Returns the suffix point of the explicit non-root `node`, computing
+    and caching suffix links of the node and of its ancestors along the
+    way.
+    """
+    if suffix_link[node] != NO_NODE:
+        return suffix_link[node], NO_NODE
+
+    # Climb up collecting ancestors whose links are still unknown.
+    top = 0
+    current = node
+    while True:
+        stack[top] = current
+        top += 1
+        up = parent[current]
+        if up == ROOT or suffix_link[up] != NO_NODE:
+            break
+        current = up
+
+    up = parent[stack[top - 1]]
+    from_root = up == ROOT
+    if from_root:
+        base_node, base_position = ROOT, NO_NODE
+    else:
+        base_node, base_position = suffix_link[up], NO_NODE
+
+    # Unwind top-down: the suffix point of each node is its edge traced
+    # from the suffix point of its parent (from the root the first
+    # letter of the edge is dropped).
+    while top > 0:
+        top -= 1
+        current = stack[top]
+        start = edge_start[current]
+        if from_root:
+            start += 1
+            from_root = False
+        base_node, base_position = _trace(
+            codes, edge_start, edge_end, first_child, next_sibling,
+            edge_letter, base_node, base_position, start, edge_end[current])
+        if base_position == NO_NODE:
+            suffix_link[current] = base_node
+
+    return base_node, base_position
+
+
+@njit(cache=True)
+def build(codes, edge_start, edge_end, parent, suffix_link,
+          first_child, next_sibling, edge_letter):
+    """
+    Runs the Ukkonen construction over the preallocated arrays and
+    returns the number of allocated nodes.
+    """
+    n = codes.shape[0]
+    node_count = 1  # the root
+    stack = np.empty(edge_start.shape[0], dtype=np.int32)
+
+    current_node, current_position = ROOT, NO_NODE
+    for i in range(n):
+        while True:
+            code = codes[i]
+            at_root = current_node == ROOT and current_position == NO_NODE
+
+            if current_position == NO_NODE:
+                # The current point is an explicit node.
+                child = _find_child(first_child, next_sibling, edge_letter,
+                                    current_node, code)
+                if child != NO_NODE:
+                    operation_type = 3
+                elif first_child[current_node] != NO_NODE or at_root:
+                    leaf = node_count
+                    node_count += 1
+                    edge_start[leaf] = i
+                    edge_end[leaf] = n
+                    parent[leaf] = current_node
+                    edge_letter[leaf] = code
+                    next_sibling[leaf] = first_child[current_node]
+                    first_child[current_node] = leaf
+                    operation_type = 2
+                else:
+                    # Leaf node, extended automatically.
+                    operation_type = 1
+
+                if operation_type == 3 or at_root:
+                    current_node, current_position = _trace(
+                        codes, edge_start, edge_end, first_child,
+                        next_sibling, edge_letter,
+                        current_node, NO_NODE, i, i + 1)
+                    break
+
+                current_node, current_position = _suffix_explicit(
+                    codes, edge_start, edge_end, parent, suffix_link,
+                    first_child, next_sibling, edge_letter,
+                    stack, current_node)
+                continue
+
+            # The current point is implicit.
+            next_code = codes[current_position]
+            if code == next_code:
+                if (first_child[current_node] != NO_NODE
+                        or current_position < i):
+                    operation_type = 3
+                else:
+                    operation_type = 1
+
+                if operation_type == 3:
+                    if edge_end[current_node] - current_position == 1:
+                        current_position = NO_NODE
+                    else:
+                        current_position += 1
+                    break
+
+                # Type 1: follow the suffix link of the implicit point.
+                up = parent[current_node]
+                if up == ROOT:
+                    current_node, current_position = _trace(
+                        codes, edge_start, edge_end, first_child,
+                        next_sibling, edge_letter, ROOT, NO_NODE,
+                        edge_start[current_node] + 1, current_position)
+                else:
+                    base_node, base_position = _suffix_explicit(
+                        codes, edge_start, edge_end, parent, suffix_link,
+                        first_child, next_sibling, edge_letter, stack, up)
+                    current_node, current_position = _trace(
+                        codes, edge_start, edge_end, first_child,
+                        next_sibling, edge_letter, base_node, base_position,
+                        edge_start[current_node], current_position)
+                continue
+
+            # Split the edge.
+            up = parent[current_node]
+            middle = node_count
+            node_count += 1
+            edge_start[middle] = edge_start[current_node]
+            edge_end[middle] = current_position
+            parent[middle] = up
+            edge_letter[middle] = edge_letter[current_node]
+
+            if first_child[up] == current_node:
+                first_child[up] = middle
+            else:
+                sibling = first_child[up]
+                while next_sibling[sibling] != current_node:
+                    sibling = next_sibling[sibling]
+                next_sibling[sibling] = middle
+            next_sibling[middle] = next_sibling[current_node]
+
+            edge_start[current_node] = current_position
+            edge_letter[current_node] = next_code
+            parent[current_node] = middle
+
+            leaf = node_count
+            node_count += 1
+            edge_start[leaf] = i
+            edge_end[leaf] = n
+            parent[leaf] = middle
+            edge_letter[leaf] = code
+            first_child[middle] = current_node
+            next_sibling[current_node] = leaf
+            next_sibling[leaf] = NO_NODE
+
+            # Following the suffix link of the split point is the same
+            # as following the link of the freshly created middle node.
+            current_node, current_position = _suffix_explicit(
+                codes, edge_start, edge_end, parent, suffix_link,
+                first_child, next_sibling, edge_letter, stack, middle)
+
+    return node_count